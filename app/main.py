@@ -1,10 +1,24 @@
 import os
+import gzip
+import socket
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+import logging.handlers
+import queue
+import hashlib
+import functools
+import itertools
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, List, Optional, Tuple
 from fastapi import FastAPI, Request, HTTPException, Response
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
+import msgspec
+import orjson
+import xxhash
+import redis.asyncio as aioredis
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -18,46 +32,173 @@ logger = logging.getLogger(__name__)
 DIFY_API_KEY = os.getenv("DIFY_API_KEY")
 DIFY_ENDPOINT = os.getenv("DIFY_ENDPOINT", "https://www.nas.bestfuture.top/v1/chat-messages")
 DIFY_APP_ID = os.getenv("DIFY_APP_ID")  # Optional, can be passed in request
+DIFY_HTTP2_CONNECTIONS = max(1, int(os.getenv("DIFY_HTTP2_CONNECTIONS", "4")))  # Size of the client pool
+DIFY_MAX_INFLIGHT = int(os.getenv("DIFY_MAX_INFLIGHT", "64"))  # Concurrent Dify calls per worker
+DIFY_QUEUE_TIMEOUT = float(os.getenv("DIFY_QUEUE_TIMEOUT", "10"))  # Seconds to wait for a free slot before 429
+REDIS_URL = os.getenv("REDIS_URL")  # Optional, shares the response cache across workers
+CACHE_TTL = int(os.getenv("CACHE_TTL", "3600"))  # Seconds a cached completion stays valid
+DIFY_GZIP_REQUESTS = os.getenv("DIFY_GZIP_REQUESTS", "false").lower() in ("1", "true")  # Opt-in, needs a gzip-aware Dify
+GZIP_MIN_SIZE = 1024  # Bodies smaller than this are sent uncompressed
+# 400 bodies that mean the gzipped payload itself couldn't be read, as opposed to ordinary app errors
+GZIP_REJECTION_MARKERS = ("gzip", "content-encoding", "decode", "could not understand")
+
+# Stop nginx and other reverse proxies from buffering or rewriting SSE responses
+STREAM_HEADERS = {
+    "X-Accel-Buffering": "no",
+    "Cache-Control": "no-cache, no-transform",
+    "Connection": "keep-alive"
+}
+
+# Static endpoint bodies, serialized once at import instead of on every probe
+HEALTH_JSON = orjson.dumps({"status": "healthy", "dify_endpoint": DIFY_ENDPOINT})
+MODELS_JSON = orjson.dumps({
+    "object": "list",
+    "data": [{"id": "dify-app", "object": "model", "created": 1677649969, "owned_by": "dify"}]
+})
+HEALTH_HEADERS = {"ETag": f'"{hashlib.sha256(HEALTH_JSON).hexdigest()[:16]}"'}
+MODELS_HEADERS = {"ETag": f'"{hashlib.sha256(MODELS_JSON).hexdigest()[:16]}"'}
 PROXY_API_KEY = os.getenv("dify2openai")  # Optional proxy authentication key (custom env var name)
 
 if not DIFY_API_KEY:
     logger.error("DIFY_API_KEY environment variable is required")
     raise ValueError("DIFY_API_KEY environment variable is required")
 
+def build_dify_client() -> httpx.AsyncClient:
+    """Create an HTTP/2 client for talking to Dify"""
+    # http2/limits must be set on the transport, the client ignores them once a transport is given
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(max_connections=200, max_keepalive_connections=50, keepalive_expiry=30),
+        retries=1,
+        # Disable Nagle so small SSE frames aren't held back by delayed ACKs
+        socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+    )
+    return httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(60.0, connect=3.0))
+
+def start_log_listener() -> logging.handlers.QueueListener:
+    """Route root log records through a queue so handler I/O happens off the event loop"""
+    root = logging.getLogger()
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *root.handlers, respect_handler_level=True)
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    listener.start()
+    return listener
+
+def stop_log_listener(listener: logging.handlers.QueueListener) -> None:
+    """Flush queued records and restore the original handlers"""
+    listener.stop()
+    logging.getLogger().handlers = list(listener.handlers)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Keep a small pool of HTTP/2 clients to Dify alive for the lifetime of the app"""
+    log_listener = start_log_listener()
+    # Each client holds its own H2 connection, so spreading requests across
+    # several of them avoids the per-connection MAX_CONCURRENT_STREAMS cap
+    app.state.clients = [build_dify_client() for _ in range(DIFY_HTTP2_CONNECTIONS)]
+    app.state.client_cycle = itertools.cycle(app.state.clients)
+    # Fall back to an in-process cache when no Redis is configured (single worker)
+    app.state.redis = aioredis.Redis.from_url(REDIS_URL) if REDIS_URL else None
+    app.state.local_cache = TTLCache(maxsize=10_000, ttl=CACHE_TTL)
+    app.state.dify_semaphore = asyncio.Semaphore(DIFY_MAX_INFLIGHT)
+    app.state.gzip_requests = DIFY_GZIP_REQUESTS
+    try:
+        yield
+    finally:
+        for client in app.state.clients:
+            await client.aclose()
+        if app.state.redis is not None:
+            await app.state.redis.aclose()
+        stop_log_listener(log_listener)
+
 app = FastAPI(
     title="OpenAI-to-Dify API Proxy",
     description="Proxy that converts OpenAI API requests to Dify format",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # OpenAI request models
-class Message(BaseModel):
+class Message(msgspec.Struct):
     role: str
     content: str
 
-class OpenAIChatCompletionRequest(BaseModel):
-    model: str = Field(..., description="Model name (mapped to Dify app)")
+class OpenAIChatCompletionRequest(msgspec.Struct):
+    model: str  # Model name (mapped to Dify app)
     messages: List[Message]
     temperature: Optional[float] = 0.7
     max_tokens: Optional[int] = None
     stream: Optional[bool] = False
     user: Optional[str] = None
 
-# Dify request models
-class DifyChatMessageRequest(BaseModel):
-    inputs: Dict[str, Any] = Field(default_factory=dict)
-    query: str
-    response_mode: str = "blocking"  # "blocking" or "streaming"
-    user: str = "openai-proxy-user"
-    conversation_id: Optional[str] = None
+# Decode request bodies straight into structs instead of going through pydantic;
+# strict=False keeps pydantic's lax coercion (e.g. "temperature": "0.5")
+chat_request_decoder = msgspec.json.Decoder(OpenAIChatCompletionRequest, strict=False)
+
+# Blocking requests currently waiting on Dify, keyed by cache key
+inflight_requests: Dict[str, asyncio.Future] = {}
+
+# Dify request headers
+@functools.lru_cache(maxsize=1024)
+def dify_headers(api_key: str) -> Dict[str, str]:
+    """Build the Dify request headers once per API key (callers must not mutate the result)"""
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept-Encoding": "br, gzip"
+    }
+
+# Response cache
+def make_cache_key(request: OpenAIChatCompletionRequest, dify_api_key: str) -> str:
+    """Build a cache key from the fields that determine the completion"""
+    # The API key selects the Dify app, so it is part of the key
+    canonical = orjson.dumps(
+        [dify_api_key, request.model, request.temperature, [[msg.role, msg.content] for msg in request.messages]],
+        option=orjson.OPT_SORT_KEYS
+    )
+    # Non-cryptographic hash: the key only needs to be collision-resistant, not secret
+    return "dify:" + xxhash.xxh3_128_hexdigest(canonical)
+
+def is_cacheable(request: OpenAIChatCompletionRequest, raw_request: Request) -> bool:
+    """Only cache deterministic requests unless the client explicitly opts in"""
+    if request.stream:
+        return False
+    opt_in = raw_request.headers.get("x-proxy-cache", "").lower() in ("1", "true")
+    return request.temperature == 0 or opt_in
+
+async def cache_get(key: str) -> Optional[bytes]:
+    """Look up a serialized completion, treating cache failures as a miss"""
+    if app.state.redis is None:
+        return app.state.local_cache.get(key)
+    try:
+        return await app.state.redis.get(key)
+    except aioredis.RedisError as e:
+        logger.warning("Cache lookup failed: %s", e)
+        return None
+
+async def cache_set(key: str, value: bytes) -> None:
+    """Store a serialized completion, ignoring cache failures"""
+    if app.state.redis is None:
+        app.state.local_cache[key] = value
+        return
+    try:
+        await app.state.redis.set(key, value, ex=CACHE_TTL)
+    except aioredis.RedisError as e:
+        logger.warning("Cache store failed: %s", e)
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "dify_endpoint": DIFY_ENDPOINT}
+    return Response(content=HEALTH_JSON, media_type="application/json", headers=HEALTH_HEADERS)
+
+@app.get("/v1/models")
+async def list_models():
+    """OpenAI-compatible model listing"""
+    return Response(content=MODELS_JSON, media_type="application/json", headers=MODELS_HEADERS)
 
 @app.post("/v1/chat/completions")
-async def chat_completions(request: OpenAIChatCompletionRequest, raw_request: Request):
+async def chat_completions(raw_request: Request):
     """
     OpenAI-compatible chat completions endpoint
     Converts OpenAI requests to Dify format and proxies the response
@@ -73,89 +214,312 @@ async def chat_completions(request: OpenAIChatCompletionRequest, raw_request: Re
             if provided_key != PROXY_API_KEY:
                 raise HTTPException(status_code=401, detail="Invalid API key")
         
-        logger.info(f"Received OpenAI request for model: {request.model}")
+        # Reject empty or message-less bodies before doing any Dify work
+        body = await raw_request.body()
+        if not body:
+            raise HTTPException(status_code=400, detail="Request body is required")
         
-        # Handle dify/ prefixed model names (e.g., dify/dify-app -> dify-app)
-        actual_model = request.model
-        if request.model.startswith("dify/"):
-            actual_model = request.model[len("dify/"):]
+        try:
+            request = chat_request_decoder.decode(body)
+        except msgspec.DecodeError as e:
+            raise HTTPException(status_code=422, detail=f"Invalid request body: {str(e)}")
         
         # Extract the last user message (Dify typically expects a single query)
         # We'll use the last message as the main query
         if not request.messages:
             raise HTTPException(status_code=400, detail="No messages provided")
         
-        # Find the last user message
+        logger.info("Received OpenAI request for model: %s", request.model)
+        
+        # Handle dify/ prefixed model names (e.g., dify/dify-app -> dify-app)
+        actual_model = request.model
+        if request.model.startswith("dify/"):
+            actual_model = request.model[len("dify/"):]
+        
+        # Find the last user message and collect system prompts in a single pass
         last_user_message = None
-        for msg in reversed(request.messages):
+        system_messages = []
+        for msg in request.messages:
             if msg.role == "user":
                 last_user_message = msg.content
-                break
+            elif msg.role == "system":
+                system_messages.append(msg.content)
         
         if last_user_message is None:
             raise HTTPException(status_code=400, detail="No user message found")
         
-        # Build Dify request
-        dify_request = DifyChatMessageRequest(
-            query=last_user_message,
-            user=request.user or "openai-proxy-user",
-            response_mode="blocking"  # Start with non-streaming
-        )
+        # Build Dify request (a plain dict, the payload is fully controlled here)
+        dify_payload = {
+            "inputs": {},
+            "query": last_user_message,
+            "response_mode": "streaming" if request.stream else "blocking",
+            "user": request.user or "openai-proxy-user"
+        }
         
         # Add conversation context if available (first message as system prompt)
-        if len(request.messages) > 1:
-            system_messages = [msg.content for msg in request.messages if msg.role == "system"]
-            if system_messages:
-                dify_request.inputs["system_prompt"] = "\n".join(system_messages)
-        
-        logger.info(f"Forwarding to Dify endpoint: {DIFY_ENDPOINT}")
-        
-        # Make request to Dify
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            headers = {
-                "Authorization": f"Bearer {DIFY_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            # Dify endpoint is already complete - no need to append app_id
-            dify_url = DIFY_ENDPOINT
-            
-            response = await client.post(
-                dify_url,
-                json=dify_request.dict(exclude_none=True),
-                headers=headers
+        if len(request.messages) > 1 and system_messages:
+            dify_payload["inputs"]["system_prompt"] = "\n".join(system_messages)
+        
+        logger.info("Forwarding to Dify endpoint: %s", DIFY_ENDPOINT)
+        
+        # Serve repeated deterministic prompts without calling Dify
+        cache_key = make_cache_key(request, DIFY_API_KEY) if is_cacheable(request, raw_request) else None
+        if cache_key:
+            cached = await cache_get(cache_key)
+            if cached is not None:
+                return Response(content=cached, media_type="application/json", headers={"X-Cache": "HIT"})
+        
+        # Make request to Dify over the shared client
+        headers = dify_headers(DIFY_API_KEY)
+        
+        # Dify endpoint is already complete - no need to append app_id
+        dify_url = DIFY_ENDPOINT
+        
+        # Round-robin across the pool; the event loop is single-threaded so no lock is needed
+        client = next(app.state.client_cycle)
+        
+        if request.stream:
+            # The Dify slot is held until the stream has been fully relayed
+            await acquire_dify_slot()
+            try:
+                response = await send_to_dify(client, dify_url, dify_payload, headers, stream=True)
+            except BaseException:
+                app.state.dify_semaphore.release()
+                raise
+            cleanup = make_stream_cleanup(response)
+            # Pipe Dify's SSE events through as they arrive instead of buffering
+            return StreamingResponse(
+                stream_dify_to_openai(response, request.model, cleanup),
+                media_type="text/event-stream",
+                headers=STREAM_HEADERS,
+                background=BackgroundTask(cleanup)
             )
-            
-            logger.info(f"Dify response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"Dify error: {response.text}")
-                # Try to parse Dify error response
-                try:
-                    error_data = response.json()
-                    error_msg = error_data.get("message", response.text)
-                except:
-                    error_msg = response.text
-                
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Dify API error: {error_msg}"
-                )
-            
-            dify_response = response.json()
-            
-            # Convert Dify response back to OpenAI format
-            openai_response = convert_dify_to_openai(dify_response, request.model)
-            
-            return JSONResponse(content=openai_response)
-            
+        
+        if cache_key:
+            # Identical requests already in flight share one upstream call
+            openai_response = await single_flight(
+                cache_key,
+                lambda: fetch_completion(client, dify_url, dify_payload, headers, request.model, cache_key)
+            )
+            return ORJSONResponse(content=openai_response, headers={"X-Cache": "MISS"})
+        
+        openai_response = await fetch_completion(client, dify_url, dify_payload, headers, request.model)
+        return ORJSONResponse(content=openai_response)
+        
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
-        logger.error(f"HTTP request error: {str(e)}")
+        logger.error("HTTP request error: %s", e)
         raise HTTPException(status_code=502, detail=f"Upstream request failed: {str(e)}")
     except Exception as e:
-        logger.error(f"Unexpected error: {str(e)}")
+        logger.error("Unexpected error: %s", e)
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
+async def acquire_dify_slot() -> None:
+    """
+    Wait for a free Dify slot, rejecting the request with 429 if none frees up in time
+    """
+    try:
+        await asyncio.wait_for(app.state.dify_semaphore.acquire(), timeout=DIFY_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("No free Dify slot after %ss, rejecting request", DIFY_QUEUE_TIMEOUT)
+        raise HTTPException(status_code=429, detail="Too many concurrent requests to Dify")
+
+def make_stream_cleanup(response: httpx.Response) -> Callable[[], Awaitable[None]]:
+    """
+    Build a callback that frees the Dify slot and closes the upstream stream exactly once
+    """
+    done = False
+    
+    async def cleanup() -> None:
+        nonlocal done
+        if done:
+            return
+        done = True
+        app.state.dify_semaphore.release()
+        await response.aclose()
+    
+    return cleanup
+
+def encode_dify_body(payload: Dict[str, Any], compress: bool = True) -> Tuple[bytes, bool]:
+    """
+    Serialize a Dify payload, gzipping it when enabled and large enough to be worth it
+    """
+    body = orjson.dumps(payload)
+    if compress and app.state.gzip_requests and len(body) > GZIP_MIN_SIZE:
+        return gzip.compress(body, compresslevel=1), True
+    return body, False
+
+def is_gzip_rejection(response: httpx.Response) -> bool:
+    """
+    Tell a rejected gzip-encoded body apart from ordinary Dify app errors
+    """
+    if response.status_code == 415:
+        return True
+    if response.status_code != 400:
+        return False
+    text = response.text.lower()
+    return any(marker in text for marker in GZIP_REJECTION_MARKERS)
+
+async def send_to_dify(client: httpx.AsyncClient, url: str, payload: Dict[str, Any], headers: Dict[str, str], stream: bool = False, compress: bool = True) -> httpx.Response:
+    """
+    Send a chat-messages request to Dify, raising HTTPException on error responses
+    """
+    body, compressed = encode_dify_body(payload, compress)
+    dify_http_request = client.build_request(
+        "POST",
+        url,
+        content=body,
+        headers={**headers, "Content-Encoding": "gzip"} if compressed else headers
+    )
+    response = await client.send(dify_http_request, stream=stream)
+    
+    if compressed and response.status_code in (400, 415):
+        if stream:
+            await response.aread()
+        if is_gzip_rejection(response):
+            # Stock Dify doesn't decode gzipped bodies; resend the same payload as plain JSON
+            logger.warning("Dify rejected a gzip-encoded body (%s), retrying uncompressed", response.status_code)
+            await response.aclose()
+            response = await send_to_dify(client, url, payload, headers, stream, compress=False)
+            # The plain resend succeeded where gzip failed, so stop compressing for this worker
+            logger.warning("Disabling request compression to Dify")
+            app.state.gzip_requests = False
+            return response
+    
+    logger.info("Dify response status: %s", response.status_code)
+    
+    if response.status_code != 200:
+        if stream:
+            await response.aread()
+        logger.error("Dify error: %s", response.text)
+        # Try to parse Dify error response
+        try:
+            error_data = orjson.loads(response.content)
+            error_msg = error_data.get("message", response.text)
+        except:
+            error_msg = response.text
+        
+        raise HTTPException(
+            status_code=response.status_code,
+            detail=f"Dify API error: {error_msg}"
+        )
+    
+    return response
+
+async def fetch_completion(client: httpx.AsyncClient, url: str, payload: Dict[str, Any], headers: Dict[str, str], model: str, cache_key: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run a blocking Dify request and return it in OpenAI format, caching it when a key is given
+    """
+    await acquire_dify_slot()
+    try:
+        response = await send_to_dify(client, url, payload, headers)
+    finally:
+        app.state.dify_semaphore.release()
+    dify_response = orjson.loads(response.content)
+    
+    # Convert Dify response back to OpenAI format
+    openai_response = convert_dify_to_openai(dify_response, model)
+    
+    if cache_key:
+        await cache_set(cache_key, orjson.dumps(openai_response))
+    
+    return openai_response
+
+async def single_flight(key: str, call: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    Coalesce concurrent calls with the same key into a single execution of call()
+    """
+    # There is no await between the lookup and the insert, so the dict needs no lock
+    future = inflight_requests.get(key)
+    if future is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # The leading request was cancelled, make the call ourselves
+            return await single_flight(key, call)
+    
+    future = asyncio.get_running_loop().create_future()
+    inflight_requests[key] = future
+    try:
+        result = await call()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # Mark as retrieved in case nobody else was waiting
+        raise
+    finally:
+        del inflight_requests[key]
+    
+    future.set_result(result)
+    return result
+
+def make_openai_chunk(event: Dict[str, Any], model: str, delta: Dict[str, Any], finish_reason: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build an OpenAI chat.completion.chunk from a Dify streaming event
+    """
+    conversation_id = event.get("conversation_id", "")
+    return {
+        "id": f"chatcmpl-{conversation_id[:16] if conversation_id else 'proxy'}",
+        "object": "chat.completion.chunk",
+        "created": event.get("created_at", 0),
+        "model": model,
+        "choices": [
+            {
+                "index": 0,
+                "delta": delta,
+                "finish_reason": finish_reason
+            }
+        ]
+    }
+
+async def stream_dify_to_openai(response: httpx.Response, model: str, cleanup: Callable[[], Awaitable[None]]) -> AsyncIterator[bytes]:
+    """
+    Convert Dify SSE events into OpenAI-compatible SSE chunks
+    """
+    role_sent = False
+    try:
+        async for line in response.aiter_lines():
+            if not line.startswith("data:"):
+                continue
+            
+            try:
+                event = orjson.loads(line[5:])
+            except orjson.JSONDecodeError:
+                event = None
+            if not isinstance(event, dict):
+                # End the stream cleanly with an error frame rather than cutting it off
+                logger.error("Malformed Dify stream event: %s", line)
+                error = {"error": {"message": "Malformed event in Dify stream", "type": "dify_api_error", "code": 502}}
+                yield b"data: " + orjson.dumps(error) + b"\n\n"
+                break
+            event_type = event.get("event")
+            
+            if event_type in ("message", "agent_message"):
+                delta = {"content": event.get("answer", "")}
+                if not role_sent:
+                    delta["role"] = "assistant"
+                    role_sent = True
+                yield b"data: " + orjson.dumps(make_openai_chunk(event, model, delta)) + b"\n\n"
+            elif event_type == "message_end":
+                yield b"data: " + orjson.dumps(make_openai_chunk(event, model, {}, "stop")) + b"\n\n"
+                break
+            elif event_type == "error":
+                logger.error("Dify stream error: %s", event.get('message'))
+                error = {"error": {"message": event.get("message", "Dify stream error"), "type": "dify_api_error", "code": event.get("status", 500)}}
+                yield b"data: " + orjson.dumps(error) + b"\n\n"
+                break
+    except httpx.HTTPError as e:
+        logger.error("Dify stream interrupted: %s", e)
+    finally:
+        await cleanup()
+    
+    yield b"data: [DONE]\n\n"
+
 def convert_dify_to_openai(dify_response: Dict[str, Any], model: str) -> Dict[str, Any]:
     """
     Convert Dify response format to OpenAI-compatible format
@@ -164,11 +528,18 @@ def convert_dify_to_openai(dify_response: Dict[str, Any], model: str) -> Dict[st
         # Dify blocking response structure
         answer = dify_response.get("answer", "")
         conversation_id = dify_response.get("conversation_id", "")
+        response_id = conversation_id[:16] if conversation_id else "proxy"
+        tokens = (dify_response.get("metadata") or {}).get("tokens") or {}
+        
+        # Word count is only a fallback when Dify doesn't report token usage
+        approx_tokens = None
+        if "completion_tokens" not in tokens or "total_tokens" not in tokens:
+            approx_tokens = len(answer.split())
         
         # Keep the original model name as provided by the client
         # This allows for custom model naming like "dify/dify-app"
         openai_response = {
-            "id": f"chatcmpl-{conversation_id[:16] if conversation_id else 'proxy'}",
+            "id": f"chatcmpl-{response_id}",
             "object": "chat.completion",
             "created": dify_response.get("created_at", 0),
             "model": model,
@@ -183,16 +554,16 @@ def convert_dify_to_openai(dify_response: Dict[str, Any], model: str) -> Dict[st
                 }
             ],
             "usage": {
-                "prompt_tokens": dify_response.get("metadata", {}).get("tokens", {}).get("prompt_tokens", 0),
-                "completion_tokens": dify_response.get("metadata", {}).get("tokens", {}).get("completion_tokens", len(answer.split())),
-                "total_tokens": dify_response.get("metadata", {}).get("tokens", {}).get("total_tokens", len(answer.split()) + 10)
+                "prompt_tokens": tokens.get("prompt_tokens", 0),
+                "completion_tokens": tokens["completion_tokens"] if "completion_tokens" in tokens else approx_tokens,
+                "total_tokens": tokens["total_tokens"] if "total_tokens" in tokens else approx_tokens + 10
             }
         }
         
         return openai_response
         
     except Exception as e:
-        logger.error(f"Error converting Dify response: {str(e)}")
+        logger.error("Error converting Dify response: %s", e)
         # Fallback response
         return {
             "id": "chatcmpl-fallback",
@@ -218,4 +589,16 @@ def convert_dify_to_openai(dify_response: Dict[str, Any], model: str) -> Dict[st
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # An import string is required for multiple workers
+    uvicorn.run(
+        "main:app",
+        app_dir=os.path.dirname(os.path.abspath(__file__)),
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1)),
+        backlog=4096,
+        timeout_keep_alive=30,
+        log_level="info"
+    )
\ No newline at end of file
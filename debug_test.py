@@ -1,14 +1,15 @@
 #!/usr/bin/env python3
 """
 Debug script to test Dify API call directly
+
+Usage: DIFY_API_KEY=app-... python debug_test.py
 """
 
-import requests
+import os
 import json
+import httpx
 
-# Your actual API key and endpoint
-API_KEY = "app-4iYnZbELM04TXhHLaq0rmjPT"
-BASE_URL = "https://www.nas.bestfuture.top/v1"
+BASE_URL = os.environ.get("DIFY_API_BASE", "https://www.nas.bestfuture.top/v1")
 
 # Test request body (same as your successful curl)
 test_request = {
@@ -19,19 +20,27 @@ test_request = {
     "user": "abc-123"
 }
 
-headers = {
-    'Authorization': f'Bearer {API_KEY}',
-    'Content-Type': 'application/json'
-}
+def main():
+    api_key = os.environ.get("DIFY_API_KEY")
+    if not api_key:
+        raise SystemExit("Set DIFY_API_KEY to your Dify app API key")
+
+    headers = {
+        'Authorization': f'Bearer {api_key}',
+        'Content-Type': 'application/json'
+    }
+
+    print("Testing direct Dify API call...")
+    print(f"URL: {BASE_URL}/chat-messages")
+    print(f"Headers: {dict(headers, Authorization='Bearer ***')}")
+    print(f"Request body: {json.dumps(test_request, indent=2)}")
+
+    try:
+        response = httpx.post(f"{BASE_URL}/chat-messages", json=test_request, headers=headers, timeout=60.0)
+        print(f"Status code: {response.status_code}")
+        print(f"Response: {response.text}")
+    except Exception as e:
+        print(f"Error: {e}")
 
-print("Testing direct Dify API call...")
-print(f"URL: {BASE_URL}/chat-messages")
-print(f"Headers: {headers}")
-print(f"Request body: {json.dumps(test_request, indent=2)}")
-
-try:
-    response = requests.post(f"{BASE_URL}/chat-messages", json=test_request, headers=headers)
-    print(f"Status code: {response.status_code}")
-    print(f"Response: {response.text}")
-except Exception as e:
-    print(f"Error: {e}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file